@@ -1,14 +1,65 @@
+import asyncio
+import hashlib
 import os
-from typing import List, Optional
-
-import requests
-from fastapi import FastAPI, HTTPException, Query
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Union
+
+import httpx
+import msgspec
+import orjson
+import redis.asyncio as redis
+from cachetools import TTLCache
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-
-from database import create_document, get_documents, db
-
-app = FastAPI(title="Recipe Genie API", version="1.1.0")
+from fastapi.responses import ORJSONResponse
+from pymongo.write_concern import WriteConcern
+
+from database import aggregate_documents, create_document, db
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One shared client per worker so upstream calls reuse keep-alive connections
+    app.state.http = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=40, keepalive_expiry=30),
+        timeout=httpx.Timeout(15.0),
+        http2=True,
+    )
+    # Optional Redis shared by all workers; without it we fall back to the in-process cache
+    redis_url = os.getenv("REDIS_URL")
+    # Short socket timeouts so an unreachable Redis degrades to the fallback instead of hanging
+    app.state.redis = (
+        redis.from_url(
+            redis_url,
+            decode_responses=True,
+            socket_connect_timeout=REDIS_TIMEOUT,
+            socket_timeout=REDIS_TIMEOUT,
+        )
+        if redis_url
+        else None
+    )
+    # Open a Mongo connection up front so the first request doesn't pay for it
+    if db is not None:
+        try:
+            await asyncio.to_thread(db.command, "ping")
+        except Exception:
+            pass
+    try:
+        yield
+    finally:
+        await app.state.http.aclose()
+        if app.state.redis is not None:
+            await app.state.redis.aclose()
+
+
+app = FastAPI(
+    title="Recipe Genie API",
+    version="1.1.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,10 +71,48 @@ app.add_middleware(
 
 
 MEALDB_BASE = "https://www.themealdb.com/api/json/v1/1"
+MEALDB_SEARCH = f"{MEALDB_BASE}/search.php"
+MEALDB_LOOKUP = f"{MEALDB_BASE}/lookup.php"
+MEALDB_FILTER = f"{MEALDB_BASE}/filter.php"
+MEALDB_RANDOM = f"{MEALDB_BASE}/random.php"
 LIBRE_TRANSLATE_URL = "https://libretranslate.de/translate"
-
-
-class FavoriteRecipeIn(BaseModel):
+LIBRE_TIMEOUT = 5
+MEAL_FIELDS = ("idMeal", "strMeal", "strMealThumb", "strCategory", "strArea", "strInstructions")
+# Multiple strings are sent to LibreTranslate as one paragraph-separated document
+TRANSLATE_BATCH_SEP = "\n\n"
+RECIPE_CACHE_CONTROL = "public, max-age=3600"
+# Search results can be degraded (translation skipped, lookups dropped), so only allow revalidation
+SEARCH_CACHE_CONTROL = "no-cache"
+# Favorites aren't critical data: by default don't wait for Mongo to acknowledge the write
+FAVORITES_WRITE_CONCERN = WriteConcern(w=int(os.getenv("FAVORITES_WRITE_W", 0)))
+
+# MealDB lookup/search responses are effectively static; keep them in-process for an hour
+_mealdb_cache: TTLCache = TTLCache(maxsize=1024, ttl=3600)
+_mealdb_cache_lock = asyncio.Lock()
+_inflight: Dict[tuple, asyncio.Task] = {}
+
+TRANSLATION_TTL = 7 * 24 * 3600
+MEAL_TTL = 24 * 3600
+# Used in place of Redis when REDIS_URL is unset or Redis is unreachable; one cache per TTL
+_shared_fallback: Dict[int, TTLCache] = {
+    TRANSLATION_TTL: TTLCache(maxsize=4096, ttl=TRANSLATION_TTL),
+    MEAL_TTL: TTLCache(maxsize=4096, ttl=MEAL_TTL),
+}
+REDIS_TIMEOUT = 0.25
+# After a Redis error, go straight to the fallback for a while instead of timing out on every call
+REDIS_BACKOFF = 30
+_redis_breaker = {"down_until": float("-inf")}
+
+# Stop calling LibreTranslate for a while after repeated failures so searches don't stall on it
+LIBRE_FAILURE_THRESHOLD = 3
+LIBRE_COOLDOWN = 60
+_libre_breaker = {"failures": 0, "open_until": float("-inf")}
+
+COLLECTIONS_TTL = 10
+_collections_cache = {"ts": float("-inf"), "val": []}
+
+
+class FavoriteRecipeIn(msgspec.Struct):
     meal_id: str
     title: str
     thumbnail: Optional[str] = None
@@ -31,11 +120,65 @@ class FavoriteRecipeIn(BaseModel):
     area: Optional[str] = None
 
 
+_favorite_decoder = msgspec.json.Decoder(FavoriteRecipeIn)
+# The body is read by a dependency, so describe it to OpenAPI by hand
+_favorite_schema = msgspec.json.schema_components([FavoriteRecipeIn])[1]["FavoriteRecipeIn"]
+FAVORITE_OPENAPI_EXTRA = {
+    "requestBody": {"required": True, "content": {"application/json": {"schema": _favorite_schema}}}
+}
+
+
+def _favorite_error_detail(body: bytes) -> List[dict]:
+    """Rebuild FastAPI's [{loc, msg, type}] detail for a body the fast decoder rejected.
+
+    Works from the parsed value and the Struct's field metadata rather than
+    msgspec's message wording, which isn't a stable interface.
+    """
+    if not body.strip():
+        return [{"loc": ["body"], "msg": "Field required", "type": "missing"}]
+    try:
+        raw = msgspec.json.decode(body)
+    except msgspec.DecodeError as e:
+        return [{"loc": ["body"], "msg": str(e), "type": "json_invalid"}]
+    if not isinstance(raw, dict):
+        return [{"loc": ["body"], "msg": "Input should be a valid dictionary", "type": "model_attributes_type"}]
+    errors = []
+    for f in msgspec.structs.fields(FavoriteRecipeIn):
+        loc = ["body", f.encode_name]
+        if f.encode_name not in raw:
+            if f.required:
+                errors.append({"loc": loc, "msg": "Field required", "type": "missing"})
+            continue
+        try:
+            msgspec.convert(raw[f.encode_name], f.type)
+        except msgspec.ValidationError as e:
+            errors.append({"loc": loc, "msg": str(e), "type": "value_error"})
+    return errors or [{"loc": ["body"], "msg": "Invalid request body", "type": "value_error"}]
+
+
+async def _decode_favorite(request: Request) -> FavoriteRecipeIn:
+    """Decode and validate the favorite body with msgspec instead of a Pydantic model."""
+    body = await request.body()
+    try:
+        return _favorite_decoder.decode(body)
+    except msgspec.DecodeError:
+        raise RequestValidationError(_favorite_error_detail(body))
+
+
 @app.get("/")
 def read_root():
     return {"message": "Recipe Genie backend is running"}
 
 
+def _cached_collection_names() -> List[str]:
+    """/test is hit by health probes; avoid a Mongo round trip on every call."""
+    now = time.monotonic()
+    if now - _collections_cache["ts"] >= COLLECTIONS_TTL:
+        _collections_cache["val"] = db.list_collection_names()[:10]
+        _collections_cache["ts"] = now
+    return _collections_cache["val"]
+
+
 @app.get("/test")
 def test_database():
     response = {
@@ -54,7 +197,7 @@ def test_database():
             response["database_name"] = db.name if hasattr(db, 'name') else "✅ Connected"
             response["connection_status"] = "Connected"
             try:
-                response["collections"] = db.list_collection_names()[:10]
+                response["collections"] = _cached_collection_names()
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
                 response["database"] = f"⚠️  Connected but Error: {str(e)[:50]}"
@@ -70,145 +213,340 @@ def test_database():
     return response
 
 
-def _translate_to_en(text: str) -> str:
-    """Translate arbitrary text to English using LibreTranslate. Falls back to original on failure."""
+def _redis():
+    """The Redis client, or None if it isn't configured or recently failed."""
+    if time.monotonic() < _redis_breaker["down_until"]:
+        return None
+    return app.state.redis
+
+
+def _redis_failed() -> None:
+    _redis_breaker["down_until"] = time.monotonic() + REDIS_BACKOFF
+
+
+async def _shared_get(key: str) -> Optional[str]:
+    """Read a value from Redis, or from the in-process fallback if Redis is unavailable."""
+    r = _redis()
+    if r is not None:
+        try:
+            return await r.get(key)
+        except Exception:
+            _redis_failed()
+    for cache in _shared_fallback.values():
+        if key in cache:
+            return cache[key]
+    return None
+
+
+async def _shared_set(key: str, value: str, ttl: int) -> None:
+    r = _redis()
+    if r is not None:
+        try:
+            await r.setex(key, ttl, value)
+            return
+        except Exception:
+            _redis_failed()
+    _shared_fallback[ttl][key] = value
+
+
+def _translation_key(text: str, target: str) -> str:
+    return f"tr:{target}:{hashlib.sha1(text.encode('utf-8')).hexdigest()}"
+
+
+def _libre_allow_request() -> bool:
+    """Whether a LibreTranslate call may go out now.
+
+    Once the cooldown ends the circuit is half-open: the first caller gets
+    through as the probe and pushes open_until forward, so concurrent callers
+    keep skipping the service until the probe has been recorded.
+    """
+    now = time.monotonic()
+    if now < _libre_breaker["open_until"]:
+        return False
+    if _libre_breaker["failures"] >= LIBRE_FAILURE_THRESHOLD:
+        _libre_breaker["open_until"] = now + LIBRE_COOLDOWN
+    return True
+
+
+def _libre_healthy(status_code: int) -> bool:
+    # For /api/translate the caller picks the target, so a 4xx other than rate limiting is their bad request
+    return status_code < 500 and status_code != 429
+
+
+def _libre_record(ok: bool) -> None:
+    """Track consecutive LibreTranslate failures and open the circuit once they hit the threshold.
+
+    The count is kept while the circuit is open, so a failed half-open probe
+    reopens it straight away; a success closes it.
+    """
+    if ok:
+        _libre_breaker["failures"] = 0
+        _libre_breaker["open_until"] = float("-inf")
+        return
+    _libre_breaker["failures"] += 1
+    if _libre_breaker["failures"] >= LIBRE_FAILURE_THRESHOLD:
+        _libre_breaker["open_until"] = time.monotonic() + LIBRE_COOLDOWN
+
+
+async def _libre_translate_batch(texts: List[str], target: str) -> List[Optional[str]]:
+    """Translate several texts in one LibreTranslate call by joining them with blank lines.
+
+    Returns one entry per input; entries are None when the call fails or the
+    response no longer splits back into the same number of parts. A single
+    input is sent and returned as-is, so blank lines inside it are harmless.
+    """
+    if not _libre_allow_request():
+        return [None] * len(texts)
     try:
-        resp = requests.post(
+        resp = await app.state.http.post(
             LIBRE_TRANSLATE_URL,
-            timeout=20,
+            timeout=LIBRE_TIMEOUT,
             headers={"Content-Type": "application/json"},
-            json={"q": text, "source": "auto", "target": "en", "format": "text"},
+            json={"q": TRANSLATE_BATCH_SEP.join(texts), "source": "auto", "target": target, "format": "text"},
         )
         if resp.status_code != 200:
-            return text
+            # input and target are ours here, so any rejection means the service isn't usable
+            _libre_record(False)
+            return [None] * len(texts)
         out = resp.json()
-        translated = out.get("translatedText", "").strip()
-        return translated or text
+        _libre_record(True)
+        translated = out.get("translatedText", "")
+        if len(texts) == 1:
+            return [translated.strip() or None]
+        parts = translated.split(TRANSLATE_BATCH_SEP)
+        if len(parts) != len(texts):
+            return [None] * len(texts)
+        return [p.strip() or None for p in parts]
     except Exception:
-        return text
+        _libre_record(False)
+        return [None] * len(texts)
+
+
+def _looks_english(text: str) -> bool:
+    """Plain ASCII letters/spaces need no translation; only non-Latin scripts go to LibreTranslate."""
+    return text.isascii() and all(c.isalpha() or c.isspace() for c in text)
+
+
+async def _translate_to_en(text: Union[str, List[str]]) -> Union[str, List[str]]:
+    """Translate text (or a list of texts, batched into one request) to English using LibreTranslate. Falls back to original on failure."""
+    texts = [text] if isinstance(text, str) else list(text)
+    keys = [_translation_key(t, "en") for t in texts]
+    results = [t if _looks_english(t) else await _shared_get(k) for t, k in zip(texts, keys)]
+    pending = [i for i, v in enumerate(results) if v is None]
+    if pending:
+        translated = await _libre_translate_batch([texts[i] for i in pending], "en")
+        for i, tr in zip(pending, translated):
+            if tr:
+                await _shared_set(keys[i], tr, TRANSLATION_TTL)
+            results[i] = tr or texts[i]
+    return results[0] if isinstance(text, str) else results
+
+
+async def _cached_get(url: str, params: dict) -> dict:
+    """GET a MealDB endpoint and return its JSON, serving repeat requests from the TTL cache."""
+    key = (url, tuple(sorted(params.items())))
+    async with _mealdb_cache_lock:
+        if key in _mealdb_cache:
+            return _mealdb_cache[key]
+        # Coalesce concurrent misses for the same key onto a single upstream request
+        task = _inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(_fetch_and_cache(key, url, params))
+            _inflight[key] = task
+            task.add_done_callback(lambda _: _inflight.pop(key, None))
+    # shield so one cancelled caller doesn't abort the fetch for everyone else
+    return await asyncio.shield(task)
+
+
+async def _fetch_and_cache(key: tuple, url: str, params: dict) -> dict:
+    r = await app.state.http.get(url, params=params)
+    r.raise_for_status()
+    data = orjson.loads(r.content)
+    async with _mealdb_cache_lock:
+        _mealdb_cache[key] = data
+    return data
+
+
+async def _mealdb_lookup(meal_id: str) -> dict:
+    """Look up a single meal, sharing results across workers under meal:{id}."""
+    if _redis() is None:
+        # Nothing to share with other workers; the in-process MealDB cache already holds the dict
+        return await _cached_get(MEALDB_LOOKUP, {"i": meal_id})
+    key = f"meal:{meal_id}"
+    cached = await _shared_get(key)
+    if cached is not None:
+        return orjson.loads(cached)
+    data = await _cached_get(MEALDB_LOOKUP, {"i": meal_id})
+    if data.get("meals"):
+        await _shared_set(key, orjson.dumps(data).decode(), MEAL_TTL)
+    return data
+
+
+def _compact_meal(m: dict) -> dict:
+    """Project a raw MealDB meal down to the fields the frontend uses.
+
+    The numbered strIngredientN/strMeasureN pairs are folded into a single
+    ``ingredients`` list with empty slots dropped.
+    """
+    out = {k: m[k] for k in MEAL_FIELDS if m.get(k)}
+    ingredients = []
+    for i in range(1, 21):
+        name = (m.get(f"strIngredient{i}") or "").strip()
+        if name:
+            ingredients.append({"name": name, "measure": (m.get(f"strMeasure{i}") or "").strip()})
+    out["ingredients"] = ingredients
+    return out
 
 
-def _mealdb_search_by_name(term: str):
-    r = requests.get(f"{MEALDB_BASE}/search.php", params={"s": term}, timeout=15)
-    r.raise_for_status()
-    data = r.json()
-    return data.get("meals") or []
+async def _mealdb_search_by_name(term: str):
+    data = await _cached_get(MEALDB_SEARCH, {"s": term})
+    return [_compact_meal(m) for m in data.get("meals") or []]
 
 
-def _mealdb_filter_by_ingredient(ingredient: str):
+async def _mealdb_filter_by_ingredient(ingredient: str):
     """Filter by ingredient returns light-weight meal list; we enrich by lookup per id."""
-    r = requests.get(f"{MEALDB_BASE}/filter.php", params={"i": ingredient}, timeout=15)
-    r.raise_for_status()
-    data = r.json()
+    data = await _cached_get(MEALDB_FILTER, {"i": ingredient})
     meals = data.get("meals") or []
-    full_meals = []
-    for m in meals[:12]:  # cap to avoid excessive calls
-        mid = m.get("idMeal")
-        if not mid:
-            continue
-        try:
-            detail = requests.get(f"{MEALDB_BASE}/lookup.php", params={"i": mid}, timeout=15)
-            detail.raise_for_status()
-            dj = detail.json()
-            if dj.get("meals"):
-                full_meals.append(dj["meals"][0])
-        except Exception:
-            continue
-    return full_meals
+    ids = [m["idMeal"] for m in meals[:12] if m.get("idMeal")]  # cap to avoid excessive calls
+    sem = asyncio.Semaphore(8)
+
+    async def _lookup(mid: str):
+        async with sem:
+            dj = await _mealdb_lookup(mid)
+        return _compact_meal(dj["meals"][0]) if dj.get("meals") else None
+
+    # Failed lookups are dropped rather than failing the whole search
+    results = await asyncio.gather(*map(_lookup, ids), return_exceptions=True)
+    return [m for m in results if isinstance(m, dict)]
+
+
+def _cacheable_response(request: Request, body: dict, cache_control: str = RECIPE_CACHE_CONTROL) -> Response:
+    """Serve body with an ETag and the given Cache-Control, answering 304 when the client copy is current."""
+    content = orjson.dumps(body)
+    etag = f'"{hashlib.md5(content).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (t.strip().removeprefix("W/") for t in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type="application/json", headers=headers)
 
 
 @app.get("/api/recipes/search")
-def search_recipes(q: str = Query(..., description="Search in any language. We auto-translate and try ingredient fallback.")):
+async def search_recipes(request: Request, q: str = Query(..., description="Search in any language. We auto-translate and try ingredient fallback.")):
+    # Start translating right away so it's ready if the direct search misses
+    trans_task = asyncio.create_task(_translate_to_en(q))
     try:
         # Try direct name search first
-        meals = _mealdb_search_by_name(q)
+        meals = await _mealdb_search_by_name(q)
 
         # If no results, translate to English and try again
+        q_en = q
         if not meals:
-            q_en = _translate_to_en(q)
+            q_en = await trans_task
             if q_en and q_en.lower() != (q or "").lower():
-                meals = _mealdb_search_by_name(q_en)
+                meals = await _mealdb_search_by_name(q_en)
 
-        # If still nothing, attempt ingredient filter (translate ingredient too)
+        # If still nothing, attempt ingredient filter (reusing the translation above)
         if not meals:
-            ingredient = _translate_to_en(q)
-            meals = _mealdb_filter_by_ingredient(ingredient)
+            meals = await _mealdb_filter_by_ingredient(q_en)
 
-        return {"count": len(meals), "meals": meals}
+        return _cacheable_response(request, {"count": len(meals), "meals": meals}, SEARCH_CACHE_CONTROL)
     except HTTPException:
         raise
-    except requests.HTTPError as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"Recipe search failed: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Recipe search failed: {str(e)}")
+    finally:
+        trans_task.cancel()
 
 
 @app.get("/api/recipes/random")
-def random_recipe():
+async def random_recipe():
     try:
-        r = requests.get(f"{MEALDB_BASE}/random.php", timeout=15)
+        r = await app.state.http.get(MEALDB_RANDOM)
         r.raise_for_status()
-        data = r.json()
-        return data
+        data = orjson.loads(r.content)
+        return {"meals": [_compact_meal(m) for m in data.get("meals") or []]}
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Random recipe failed: {str(e)}")
 
 
 @app.get("/api/recipes/{meal_id}")
-def get_recipe(meal_id: str):
+async def get_recipe(meal_id: str, request: Request):
     try:
-        r = requests.get(f"{MEALDB_BASE}/lookup.php", params={"i": meal_id}, timeout=15)
-        r.raise_for_status()
-        return r.json()
+        data = await _mealdb_lookup(meal_id)
+        return _cacheable_response(request, {"meals": [_compact_meal(m) for m in data.get("meals") or []] or None})
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Recipe lookup failed: {str(e)}")
 
 
-@app.post("/api/favorites")
-def add_favorite(payload: FavoriteRecipeIn):
+@app.post("/api/favorites", openapi_extra=FAVORITE_OPENAPI_EXTRA)
+def add_favorite(payload: FavoriteRecipeIn = Depends(_decode_favorite)):
     try:
-        doc_id = create_document("recipefavorite", payload.model_dump())
+        doc_id = create_document("recipefavorite", msgspec.structs.asdict(payload), FAVORITES_WRITE_CONCERN)
         return {"ok": True, "id": doc_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save favorite: {str(e)}")
 
 
 @app.get("/api/favorites")
-def list_favorites(limit: int = 50):
+def list_favorites(limit: int = Query(50, ge=0)):
     try:
-        docs = get_documents("recipefavorite", {}, limit)
-        # convert ObjectId
-        for d in docs:
-            if "_id" in d:
-                d["id"] = str(d.pop("_id"))
-        return {"items": docs}
+        # let Mongo convert ObjectId -> id so documents come back ready to serialize
+        pipeline = [{"$limit": limit}] if limit else []
+        pipeline += [
+            {"$addFields": {"id": {"$toString": "$_id"}}},
+            {"$project": {"_id": 0}},
+        ]
+        return {"items": aggregate_documents("recipefavorite", pipeline)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list favorites: {str(e)}")
 
 
 @app.get("/api/translate")
-def translate_text(text: str, target: str = Query(..., description="Target language code, e.g., 'es', 'fr', 'hi', 'ar'")):
+async def translate_text(text: str, target: str = Query(..., description="Target language code, e.g., 'es', 'fr', 'hi', 'ar'")):
     """
     Translate text using LibreTranslate public instance (no key required).
     """
+    key = _translation_key(text, target)
+    cached = await _shared_get(key)
+    if cached is not None:
+        return {"translated": cached}
+    if not _libre_allow_request():
+        raise HTTPException(status_code=503, detail="Translation service temporarily unavailable")
     try:
-        resp = requests.post(
+        resp = await app.state.http.post(
             LIBRE_TRANSLATE_URL,
-            timeout=20,
+            timeout=LIBRE_TIMEOUT,
             headers={"Content-Type": "application/json"},
             json={"q": text, "source": "auto", "target": target, "format": "text"},
         )
         if resp.status_code != 200:
+            _libre_record(_libre_healthy(resp.status_code))
             raise HTTPException(status_code=resp.status_code, detail=f"Translation error: {resp.text[:120]}")
         out = resp.json()
-        return {"translated": out.get("translatedText", "")}
+        _libre_record(True)
+        translated = out.get("translatedText", "")
+        if translated:
+            await _shared_set(key, translated, TRANSLATION_TTL)
+        return {"translated": translated}
     except HTTPException:
         raise
     except Exception as e:
+        _libre_record(False)
         raise HTTPException(status_code=502, detail=f"Translation service failed: {str(e)}")
 
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Workers need an import string; uvloop/httptools come with uvicorn[standard]
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        workers=int(os.getenv("WEB_CONCURRENCY", 4)),
+        loop="uvloop",
+        http="httptools",
+    )